@@ -0,0 +1,127 @@
+""" Benchmark the import time added by loading the kernmagic extension.
+
+Each scenario is run in a fresh interpreter under `python -X importtime`. The
+modules imported by loading the extension are the ones that are not already
+imported by starting up an IPython shell, and their self times are summed.
+
+The script exits with a non-zero status if loading the extension imports
+kernmagic.mymagics, if it takes longer than --max-ms, or if
+kernmagic.MAGIC_NAMES does not list exactly the line magics of KernMagics.
+
+Usage: python benchmarks/bench_import.py [--repeat R] [--max-ms MS]
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+SHELL_SOURCE = """
+from IPython.core.interactiveshell import InteractiveShell
+ip = InteractiveShell.instance()
+"""
+
+SCENARIOS = [
+    ('lazy', SHELL_SOURCE + """
+import kernmagic
+kernmagic.load_ipython_extension(ip)
+"""),
+    ('eager', SHELL_SOURCE + """
+import kernmagic
+kernmagic.load_ipython_extension(ip)
+import kernmagic.mymagics
+"""),
+]
+
+
+def import_times(source):
+    """ Run the source in a fresh interpreter and return a dict mapping the
+    names of the imported modules to their self import times in microseconds.
+    """
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + [p for p in [env.get('PYTHONPATH')] if p])
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', source],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            env=env, universal_newlines=True)
+    _, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(stderr)
+    times = {}
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(self_us)
+    return times
+
+
+def extension_cost(source, baseline):
+    """ Return the modules imported by the source, but not by the baseline,
+    and the total of their self import times in milliseconds.
+    """
+    times = import_times(source)
+    modules = set(times) - set(baseline)
+    total_ms = sum(times[name] for name in modules) / 1000.0
+    return modules, total_ms
+
+
+def check_magic_names():
+    """ Return the line magics missing from kernmagic.MAGIC_NAMES and the
+    names in it that are not line magics.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, root)
+    import kernmagic
+    from kernmagic.mymagics import KernMagics
+    stubbed = set(kernmagic.MAGIC_NAMES)
+    real = set(KernMagics.magics['line'])
+    return sorted(real - stubbed), sorted(stubbed - real)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--max-ms', type=float,
+                        help="fail if the lazy load takes longer than this")
+    args = parser.parse_args()
+
+    baseline = import_times(SHELL_SOURCE)
+    results = {}
+    for name, source in SCENARIOS:
+        best = None
+        for _ in range(args.repeat):
+            modules, total_ms = extension_cost(source, baseline)
+            if best is None or total_ms < best[1]:
+                best = (modules, total_ms)
+        results[name] = best
+        print('%-6s %8.2f ms  %3d modules' % (name, best[1], len(best[0])))
+    lazy_modules, lazy_ms = results['lazy']
+    print('Saved  %8.2f ms' % (results['eager'][1] - lazy_ms))
+
+    failed = False
+    if 'kernmagic.mymagics' in lazy_modules:
+        print('FAIL: loading the extension imported kernmagic.mymagics')
+        failed = True
+    if args.max_ms is not None and lazy_ms > args.max_ms:
+        print('FAIL: loading the extension took more than %s ms' %
+              args.max_ms)
+        failed = True
+    missing, extra = check_magic_names()
+    if missing:
+        print('FAIL: kernmagic.MAGIC_NAMES is missing %s' % ', '.join(missing))
+        failed = True
+    if extra:
+        print('FAIL: kernmagic.MAGIC_NAMES has unknown magics %s' %
+              ', '.join(extra))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+""" Benchmarks for kernmagic.inplace_edit.
+"""
+
+from run_benchmarks import parametrize
+
+
+def original_function():
+    return 0
+
+
+@parametrize(nlines=[10, 100, 1000])
+def time_execute_source(nlines):
+    from IPython.core.interactiveshell import InteractiveShell
+    from kernmagic.inplace_edit import Inplace
+    inplace = Inplace(InteractiveShell.instance())
+    body = ['    x_%d = %d * 2' % (i, i) for i in range(nlines)]
+    new_source = '\n'.join(['def original_function():'] + body +
+                           ['    return x_0', ''])
+    return lambda: inplace.execute_source(original_function, new_source)
@@ -0,0 +1,99 @@
+""" Benchmarks for the magics in kernmagic.mymagics.
+"""
+
+from __future__ import print_function
+
+from io import StringIO
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+from run_benchmarks import parametrize
+
+
+FILE_SIZES = [1024, 1024 ** 2, 16 * 1024 ** 2]
+
+
+def make_magics():
+    """ Return a KernMagics instance attached to an IPython shell.
+    """
+    from IPython.core.interactiveshell import InteractiveShell
+    from kernmagic.mymagics import KernMagics
+    return KernMagics(shell=InteractiveShell.instance())
+
+
+_tmpdir = []
+
+
+def temp_path(name):
+    """ Return a path in a temporary directory that is created the first time
+    it is needed and removed at exit.
+    """
+    if not _tmpdir:
+        _tmpdir.append(tempfile.mkdtemp(prefix='kernmagic_bench_'))
+        atexit.register(shutil.rmtree, _tmpdir[0], True)
+    return os.path.join(_tmpdir[0], name)
+
+
+def silently(func, *args):
+    """ Return a callable that calls the function with its output discarded.
+    """
+    def call():
+        stdout = sys.stdout
+        with open(os.devnull, 'w') as sys.stdout:
+            try:
+                func(*args)
+            finally:
+                sys.stdout = stdout
+    return call
+
+
+@parametrize(size=FILE_SIZES, mode=['wb', 'w'])
+def time_fwrite(size, mode):
+    magics = make_magics()
+    magics.shell.user_ns['bench_text'] = 'x' * size
+    filename = temp_path('fwrite_%d' % size)
+    return (lambda: magics.fwrite('-m %s bench_text %s' % (mode, filename)),
+            size)
+
+
+@parametrize(size=FILE_SIZES, mode=['rb', 'r'])
+def time_fread(size, mode):
+    magics = make_magics()
+    filename = temp_path('fread_%d' % size)
+    with open(filename, 'wb') as f:
+        f.write(b'x' * size)
+    return (lambda: magics.fread('-m %s bench_text %s' % (mode, filename)),
+            size)
+
+
+@parametrize(nmethods=[10, 100, 1000], group=[True, False])
+def time_print_methods(nmethods, group):
+    magics = make_magics()
+    methods = dict(('method_%d' % i, lambda self: None)
+                   for i in range(nmethods))
+    magics.shell.user_ns['BenchClass'] = type('BenchClass', (object,),
+                                              methods)
+    arg = 'BenchClass' if group else '-n BenchClass'
+    return silently(magics.print_methods, arg)
+
+
+@parametrize(nexamples=[10, 100, 1000], cached=[False, True])
+def time_doctest_demo_reload(nexamples, cached):
+    from kernmagic import mymagics
+    lines = ['An example docstring.', '']
+    for i in range(nexamples):
+        lines.extend(['Example %d:' % i, '',
+                      '>>> x_%d = [%d] * 3' % (i, i),
+                      '>>> len(x_%d)' % i, '3', ''])
+    docstring = u'\n'.join(lines)
+    demo = mymagics.DoctestDemo(StringIO(docstring), seed_ns={})
+
+    def reload():
+        if not cached:
+            mymagics._parsed_docstrings.clear()
+        demo.src = StringIO(docstring)
+        demo.reload()
+    return reload
@@ -0,0 +1,128 @@
+""" Benchmark name lookup and assignment in the namespaces that
+%replace_context can install.
+
+Cell code is executed at module level, with the namespace as both its globals
+and its locals, the same way that IPython executes cells. Functions defined in
+a cell use the namespace as their globals, so global lookups from inside a
+function are measured too.
+
+Usage: python benchmarks/bench_namespace.py [--loops N] [--repeat R]
+
+The lookup, function lookup and assignment benchmarks are also run by run_benchmarks.py.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kernmagic.namespace import VersionedNamespace
+
+from run_benchmarks import parametrize
+
+
+LOOKUP_SOURCE = """
+for i in range(loops):
+    x; x; x; x; x; x; x; x; x; x
+"""
+
+ASSIGN_SOURCE = """
+for i in range(loops):
+    y = i; y = i; y = i; y = i; y = i; y = i; y = i; y = i; y = i; y = i
+"""
+
+FUNCTION_LOOKUP_SOURCE = """
+def lookup(loops):
+    for i in range(loops):
+        x; x; x; x; x; x; x; x; x; x
+lookup(loops)
+"""
+
+# Each loop iteration does this many lookups or assignments.
+OPS_PER_LOOP = 10
+
+
+def namespace_factories():
+    """ Return (name, factory) pairs for the namespaces to compare.
+    """
+    factories = [
+        ('dict', dict),
+        ('VersionedNamespace', VersionedNamespace),
+    ]
+    try:
+        from codetools.contexts.api import DataContext
+    except ImportError:
+        pass
+    else:
+        factories.append(
+            ('DataContext', lambda ns: DataContext(subcontext=ns)))
+    return factories
+
+
+def best_time(factory, source, loops, repeat):
+    """ Return the best time in seconds to execute the source in a namespace
+    from the factory.
+    """
+    code = compile(source, '<benchmark>', 'exec')
+    best = None
+    for _ in range(repeat):
+        ns = factory({'x': 1, 'loops': loops})
+        start = timeit.default_timer()
+        exec(code, ns, ns)
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _exec_in(namespace, source, loops=1000):
+    """ Return a callable that executes the source in a namespace of the named
+    kind.
+    """
+    factory = dict(namespace_factories())[namespace]
+    code = compile(source, '<benchmark>', 'exec')
+    ns = factory({'x': 1, 'loops': loops})
+
+    def run():
+        exec(code, ns, ns)
+    return run
+
+
+@parametrize(namespace=[name for name, factory in namespace_factories()])
+def time_namespace_lookup(namespace):
+    return _exec_in(namespace, LOOKUP_SOURCE)
+
+
+@parametrize(namespace=[name for name, factory in namespace_factories()])
+def time_namespace_function_lookup(namespace):
+    return _exec_in(namespace, FUNCTION_LOOKUP_SOURCE)
+
+
+@parametrize(namespace=[name for name, factory in namespace_factories()])
+def time_namespace_assign(namespace):
+    return _exec_in(namespace, ASSIGN_SOURCE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--loops', type=int, default=100000)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    nops = args.loops * OPS_PER_LOOP
+    print('%-20s %16s %20s %16s' % ('Namespace', 'Lookups/s',
+                                     'Function lookups/s', 'Assignments/s'))
+    for name, factory in namespace_factories():
+        times = [best_time(factory, source, args.loops, args.repeat)
+                 for source in [LOOKUP_SOURCE, FUNCTION_LOOKUP_SOURCE,
+                                ASSIGN_SOURCE]]
+        print('%-20s %16.0f %20.0f %16.0f' % tuple(
+            [name] + [nops / t for t in times]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+""" Benchmarks for kernmagic.utils.
+"""
+
+from kernmagic import utils
+
+from run_benchmarks import parametrize
+
+
+def _names(n):
+    """ Return n identifier-like strings of varying lengths.
+    """
+    return ['name_%s' % ('x' * (i % 17)) + str(i) for i in range(n)]
+
+
+@parametrize(n=[10, 100, 1000, 5000])
+def time_columnize(n):
+    strings = _names(n)
+    return lambda: utils.columnize(strings, displaywidth=80)
+
+
+@parametrize(n=[10, 100, 1000, 5000])
+def time_wrap_key_values(n):
+    key_values = [(name, 'value %s ' % name * 8) for name in _names(n)]
+    return lambda: utils.wrap_key_values(key_values, width=80)
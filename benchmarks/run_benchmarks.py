@@ -0,0 +1,204 @@
+""" Run kernmagic's benchmark suite.
+
+Benchmarks are the functions named time_* in the benchmarks/bench_*.py
+modules. Each one is called with one combination of its parameters (see
+parametrize()) and does any setup it needs, then returns the zero-argument
+callable to time, or a (callable, nbytes) pair for benchmarks that measure
+throughput.
+
+The results are written as JSON so that runs from different versions can be
+compared with --compare.
+
+Usage: python benchmarks/run_benchmarks.py [-k PATTERN] [-o OUTPUT.json]
+                                           [--compare BASELINE.json]
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import glob
+import importlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+import traceback
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARK_DIR)
+
+
+def parametrize(**params):
+    """ Decorate a benchmark to run it with every combination of the given
+    parameter values.
+    """
+    def decorator(func):
+        func.params = sorted(params.items())
+        return func
+    return decorator
+
+
+def collect(pattern=None):
+    """ Return (name, function, kwds) for each benchmark to run.
+    """
+    benchmarks = []
+    for filename in sorted(glob.glob(os.path.join(BENCHMARK_DIR,
+                                                  'bench_*.py'))):
+        module_name = os.path.splitext(os.path.basename(filename))[0]
+        module = importlib.import_module(module_name)
+        for attr in sorted(vars(module)):
+            func = getattr(module, attr)
+            if not attr.startswith('time_') or not callable(func):
+                continue
+            params = getattr(func, 'params', [])
+            keys = [k for k, v in params]
+            for values in itertools.product(*[v for k, v in params]):
+                kwds = dict(zip(keys, values))
+                name = '%s.%s' % (module_name, attr)
+                if kwds:
+                    name += '(%s)' % ', '.join('%s=%r' % (k, kwds[k])
+                                               for k in keys)
+                if pattern is None or pattern in name:
+                    benchmarks.append((name, func, kwds))
+    return benchmarks
+
+
+def time_callable(func, repeat, min_time):
+    """ Time a callable.
+
+    The number of calls per measurement is calibrated so that each
+    measurement takes at least `min_time` seconds. Returns the per-call times
+    of each measurement and the number of calls.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1000000:
+            break
+        number *= 10
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        times.append(timer.timeit(number) / number)
+    return times, number
+
+
+def run(benchmarks, repeat, min_time):
+    """ Run the benchmarks and return the results keyed by name.
+    """
+    results = {}
+    for name, func, kwds in benchmarks:
+        try:
+            target = func(**kwds)
+            nbytes = None
+            if isinstance(target, tuple):
+                target, nbytes = target
+            times, number = time_callable(target, repeat, min_time)
+        except Exception:
+            error = traceback.format_exception_only(*sys.exc_info()[:2])
+            results[name] = dict(error=''.join(error).strip())
+            print('%-60s ERROR %s' % (name, results[name]['error']))
+            continue
+        times.sort()
+        result = dict(
+            min=times[0],
+            median=times[len(times) // 2],
+            number=number,
+            repeat=len(times),
+        )
+        text = '%-60s %12.3f us' % (name, result['min'] * 1e6)
+        if nbytes is not None:
+            result['bytes_per_second'] = nbytes / result['min']
+            text += '  %10.1f MB/s' % (result['bytes_per_second'] / 1e6)
+        results[name] = result
+        print(text)
+    return results
+
+
+def metadata():
+    """ Describe the code and machine that the benchmarks ran on.
+    """
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.STDOUT, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(
+        commit=commit,
+        date=datetime.datetime.now().isoformat(),
+        python=platform.python_version(),
+        implementation=platform.python_implementation(),
+        machine=platform.machine(),
+        platform=platform.platform(),
+    )
+
+
+def compare(baseline, results, threshold):
+    """ Print the change in each benchmark relative to the baseline and return
+    the names of those that got slower by more than the threshold factor, or
+    that ran in the baseline but fail now.
+    """
+    regressions = []
+    print('')
+    print('%-60s %10s %10s %7s' % ('Benchmark', 'Before', 'After', 'Ratio'))
+    for name in sorted(results):
+        old = baseline.get(name)
+        new = results[name]
+        if old is None or 'min' not in old:
+            continue
+        if 'min' not in new:
+            regressions.append(name)
+            print('%-60s %8.1fus %10s %7s  ERROR' % (
+                name, old['min'] * 1e6, '-', '-'))
+            continue
+        ratio = new['min'] / old['min']
+        flag = ''
+        if ratio > threshold:
+            flag = '  SLOWER'
+            regressions.append(name)
+        elif ratio < 1.0 / threshold:
+            flag = '  faster'
+        print('%-60s %8.1fus %8.1fus %7.2f%s' % (
+            name, old['min'] * 1e6, new['min'] * 1e6, ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', '--pattern',
+                        help="only run benchmarks whose names contain this")
+    parser.add_argument('-o', '--output',
+                        help="write the results to this JSON file")
+    parser.add_argument('-c', '--compare', metavar='BASELINE',
+                        help="compare against the results in this JSON file")
+    parser.add_argument('-t', '--threshold', type=float, default=1.2,
+                        help=("the slowdown factor that counts as a "
+                              "regression [default: %(default)s]"))
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help=("the minimum time in seconds for each "
+                              "measurement [default: %(default)s]"))
+    args = parser.parse_args()
+
+    sys.path.insert(0, BENCHMARK_DIR)
+    sys.path.insert(0, ROOT)
+    results = run(collect(args.pattern), args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(metadata=metadata(), results=results), f,
+                      indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,53 @@
 """ Robert Kern's magics for IPython.
 """
 
+# The line magics defined by kernmagic.mymagics.KernMagics. Stubs are
+# registered under these names so that the real implementations, and their
+# imports, are only loaded the first time one of them is used.
+MAGIC_NAMES = [
+    'attach',
+    'err_report',
+    'fread',
+    'fwrite',
+    'inplace',
+    'lambdify',
+    'pop_err',
+    'pop_print',
+    'print_methods',
+    'print_traits',
+    'push_err',
+    'push_print',
+    'reload',
+    'replace_context',
+    'run_examples',
+    'share',
+    'sym',
+]
 
-def load_ipython_extension(ip):
+
+def _load_magics(ip):
+    """ Import and register the real magics in place of the stubs.
+    """
     from .mymagics import KernMagics
 
     ip.register_magics(KernMagics)
+
+
+def _make_stub(ip, name):
+    """ Make a stub line magic which loads the real magics and then runs the
+    real one.
+    """
+    def stub(line):
+        _load_magics(ip)
+        return ip.run_line_magic(name, line)
+    stub.__name__ = name
+    stub.__doc__ = ("Load kernmagic's magics and run %%%s.\n\nUse %%%s? again "
+                    "afterwards for its full help." % (name, name))
+    return stub
+
+
+def load_ipython_extension(ip):
+    for name in MAGIC_NAMES:
+        ip.register_magic_function(_make_stub(ip, name), 'line', name)
     ip.magics_manager.register_alias('pt', 'print_traits')
     ip.magics_manager.register_alias('pm', 'print_methods')
@@ -2,13 +2,13 @@ from __future__ import print_function
 
 import atexit
 import hashlib
-import imp
 import inspect
 import linecache
 import os
 import sys
 import tempfile
 import textwrap
+import types
 import weakref
 
 from IPython.utils import io
@@ -84,12 +84,15 @@ class Inplace(object):
         """ Execute source code to replace the original function/method.
         """
         # Create the module.
-        hash = hashlib.sha1(new_source).hexdigest()
+        encoded = new_source
+        if not isinstance(encoded, bytes):
+            encoded = encoded.encode('utf-8')
+        hash = hashlib.sha1(encoded).hexdigest()
         filename = 'inplace_%s.py' % hash
         name = 'inplace_%s' % hash
-        mod = imp.new_module(name)
+        mod = types.ModuleType(name)
         # Supply the correct globals.
-        mod.__dict__.update(original.func_globals)
+        mod.__dict__.update(as_func(original).__globals__)
         linecache.cache[filename] = (
             len(new_source), None,
             [x+'\n' for x in new_source.splitlines()], filename)
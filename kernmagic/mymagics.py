@@ -3,13 +3,21 @@
 
 from __future__ import print_function
 
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, namedtuple
 from io import StringIO
+from timeit import default_timer
 import doctest
+import functools
+import hashlib
 import importlib
 import inspect
+import itertools
+import linecache
 import os
+import re
 import sys
+import tempfile
+import traceback
 import types
 
 from IPython.core.error import UsageError
@@ -22,7 +30,55 @@ from IPython.utils import io
 from . import utils
 
 
-ERROR_CHOICES = ["ignore", "warn", "raise", "call", "log"]
+ERROR_CHOICES = ["ignore", "warn", "raise", "call", "log", "count"]
+
+# The sympy assumptions for each kind of %sym variable. These are shared by
+# all of the symbols created in bulk rather than rebuilt for each one.
+SYMBOL_ASSUMPTIONS = {
+    None: {},
+    'integer': {'integer': True},
+    'real': {'real': True},
+    'complex': {'complex': True},
+    'function': {},
+}
+
+# x0:1000 creates x0, x1, ..., x999.
+SYMBOL_RANGE_RE = re.compile(r'^([A-Za-z_]\w*?)(\d+):(\d+)$')
+# A[3,3] creates A_0_0, A_0_1, ..., A_2_2.
+SYMBOL_SHAPE_RE = re.compile(r'^([A-Za-z_]\w*)\[(\d+(?:\s*,\s*\d+)*)\]$')
+
+
+def expand_symbol_names(spec):
+    """ Expand a %sym name specification.
+
+    Returns the name to bind a grouped result to, the shape of the group, the
+    list of individual symbol names, and a short label for the group.
+    """
+    match = SYMBOL_RANGE_RE.match(spec)
+    if match is not None:
+        prefix, start, stop = match.groups()
+        start, stop = int(start), int(stop)
+        if stop <= start:
+            raise UsageError("empty range: %s" % spec)
+        names = ['%s%d' % (prefix, i) for i in range(start, stop)]
+        if len(names) == 1:
+            label = names[0]
+        else:
+            label = '%s..%s' % (names[0], names[-1])
+        return prefix, (len(names),), names, label
+    match = SYMBOL_SHAPE_RE.match(spec)
+    if match is not None:
+        base, dims = match.groups()
+        shape = tuple(int(x) for x in dims.split(','))
+        if 0 in shape:
+            raise UsageError("empty shape: %s" % spec)
+        indices = itertools.product(*[range(n) for n in shape])
+        names = ['%s_%s' % (base, '_'.join(map(str, index)))
+                 for index in indices]
+        return base, shape, names, '%s[%s]' % (base, ','.join(map(str, shape)))
+    if re.match(r'^[A-Za-z_]\w*$', spec) is None:
+        raise UsageError("invalid variable name: %s" % spec)
+    return spec, None, [spec], spec
 
 
 def print_numpy_printoptions(opts):
@@ -35,7 +91,85 @@ def print_numpy_printoptions(opts):
             "Suppress:   {suppress}\n"
             "NaN:        {nanstr}\n"
             "Inf:        {infstr}").format(**opts)
-    print(text, file=io.stdout)
+    print(text)
+
+
+# Rough cost of rendering one array element in the repr, in microseconds, by
+# dtype kind.
+RENDER_COST_US = {
+    'b': 0.5,
+    'i': 1.0,
+    'u': 1.0,
+    'f': 2.5,
+    'c': 5.0,
+    'm': 2.0,
+    'M': 4.0,
+    'S': 1.0,
+    'U': 1.0,
+    'V': 10.0,
+    'O': 10.0,
+}
+
+
+class BudgetedArrayFormatter(object):
+    """ An IPython plain text formatter for numpy arrays that stays within a
+    render budget.
+
+    The cost of the full repr is estimated from the shape and dtype. If it is
+    over the budget, the summarized repr is used instead, or, if even that is
+    too expensive, a summary of the array's statistics.
+    """
+
+    def __init__(self, budget_ms):
+        self.budget_ms = budget_ms
+
+    def __repr__(self):
+        return '<%s: %s ms>' % (type(self).__name__, self.budget_ms)
+
+    def estimate_ms(self, arr, summarize=False):
+        """ Estimate the time it takes to render the repr of an array.
+        """
+        import numpy
+        opts = numpy.get_printoptions()
+        if summarize or arr.size > opts['threshold']:
+            edge = 2 * opts['edgeitems']
+            nitems = 1
+            for dim in arr.shape:
+                nitems *= min(dim, edge)
+        else:
+            nitems = arr.size
+        # Structured dtypes cost about as much as their fields.
+        nfields = len(arr.dtype.names or ()) or 1
+        cost_us = RENDER_COST_US.get(arr.dtype.kind, 10.0) * nfields
+        return nitems * cost_us / 1000.0
+
+    def __call__(self, arr, p, cycle):
+        import numpy
+        if self.estimate_ms(arr) <= self.budget_ms:
+            text = repr(arr)
+        elif self.estimate_ms(arr, summarize=True) <= self.budget_ms:
+            old_options = numpy.get_printoptions()
+            numpy.set_printoptions(threshold=0)
+            try:
+                text = repr(arr)
+            finally:
+                numpy.set_printoptions(**old_options)
+        else:
+            text = array_stats_summary(arr)
+        p.text(text)
+
+
+def array_stats_summary(arr):
+    """ Return a short summary of an array: its shape, dtype and, for numeric
+    arrays, its min, max and mean.
+    """
+    import numpy
+    text = 'array(shape=%r, dtype=%s' % (arr.shape, arr.dtype)
+    if arr.size and arr.dtype.kind in 'biufc':
+        with numpy.errstate(all='ignore'):
+            stats = (arr.min(), arr.max(), arr.mean())
+        text += ', min=%s, max=%s, mean=%s' % stats
+    return text + ')'
 
 
 def print_numpy_err(modes, errcall):
@@ -46,39 +180,205 @@ def print_numpy_err(modes, errcall):
             "Underflow: {under}\n"
             "Invalid:   {invalid}\n"
             "Call:      {errcall}").format(errcall=errcall, **modes)
-    print(text, file=io.stdout)
+    print(text)
 
 
-class DoctestDemo(demo.IPythonDemo):
-    """ Extract doctest blocks for demo purposes.
+class ErrorCounter(object):
+    """ A numpy errcall that aggregates floating point errors.
+
+    Errors are counted by type. The calling source line is only captured for
+    every `sample`-th error so that the cost per event stays small and fixed.
     """
 
-    def reset(self):
-        """Reset the namespace and seek pointer to restart the demo"""
-        self.user_ns = {}
-        self.user_ns.update(self.ip_ns)
-        self.finished = False
-        self.block_index = 0
+    def __init__(self, sample=16):
+        self.sample = max(int(sample), 1)
+        self.total = 0
+        self.by_type = defaultdict(int)
+        # Map (filename, lineno, function name) to the number of sampled
+        # errors from that line.
+        self.by_line = defaultdict(int)
 
-    def reload(self):
-        """ Reload source and initialize state.
+    def __call__(self, err, flag):
+        self.total += 1
+        self.by_type[err] += 1
+        if (self.total - 1) % self.sample == 0:
+            frame = sys._getframe(1)
+            code = frame.f_code
+            self.by_line[(code.co_filename, frame.f_lineno,
+                          code.co_name)] += 1
+
+    def __repr__(self):
+        return '<%s: %d errors>' % (type(self).__name__, self.total)
+
+    def report(self, top=10):
+        """ Return a text report of the errors counted so far.
         """
-        self.fload()
-        docstring = self.fobj.read()
+        if not self.total:
+            return 'No floating point errors.'
+        lines = ['%d floating point errors:' % self.total]
+        for err, count in sorted(self.by_type.items(),
+                                 key=lambda kv: -kv[1]):
+            lines.append('  %-20s %d' % (err, count))
+        if self.by_line:
+            lines.append('Most frequent sources (sampled 1 in %d):' %
+                         self.sample)
+            lines_counts = sorted(self.by_line.items(),
+                                  key=lambda kv: -kv[1])[:top]
+            for (filename, lineno, name), count in lines_counts:
+                lines.append('  %s:%d (%s): %d' % (filename, lineno, name,
+                                                    count))
+        return '\n'.join(lines)
+
+
+# The outcome of running a single example in batch mode. `name` is the title of
+# the demo the example came from, `elapsed` is the wall time in seconds and
+# `peak` is the peak memory allocated by the example in bytes, or None if
+# memory was not traced.
+ExampleResult = namedtuple('ExampleResult',
+                           'name index source want got matched elapsed peak')
+
+
+def format_bytes(nbytes):
+    """ Format a number of bytes for human consumption.
+    """
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(nbytes) < 1024.0 or unit == 'GiB':
+            break
+        nbytes /= 1024.0
+    if unit == 'B':
+        return '%d %s' % (nbytes, unit)
+    return '%.1f %s' % (nbytes, unit)
+
+
+def print_example_report(results, top=10):
+    """ Print a summary of batch-mode example results: the slowest examples
+    and any mismatched output.
+    """
+    total = sum(r.elapsed for r in results)
+    mismatches = [r for r in results if not r.matched]
+    print('Ran %d examples in %.3f s: %d passed, %d failed.' % (
+        len(results), total, len(results) - len(mismatches),
+        len(mismatches)))
+    slowest = sorted(results, key=lambda r: r.elapsed, reverse=True)[:top]
+    if slowest:
+        print('')
+        print('Slowest examples:')
+        labels = ['%s:%d' % (r.name, r.index) for r in slowest]
+        width = max(len(label) for label in labels + ['Example'])
+        print('  %-*s  %10s  %10s  %s' % (width, 'Example', 'Time (ms)',
+                                          'Peak mem', 'Source'))
+        for label, r in zip(labels, slowest):
+            source = (r.source.splitlines() or [''])[0]
+            if len(source) > 50:
+                source = source[:47] + '...'
+            if r.peak is None:
+                peak = '-'
+            else:
+                peak = format_bytes(r.peak)
+            print('  %-*s  %10.3f  %10s  %s' % (
+                width, label, r.elapsed * 1000.0, peak, source))
+    for r in mismatches:
+        print('')
+        print('Example %s:%d failed:' % (r.name, r.index))
+        print(r.source)
+        print('Expected:')
+        print(r.want or '<nothing>')
+        print('Got:')
+        print(r.got or '<nothing>')
+
+
+class ParsedDocstring(object):
+    """ The parsed doctest blocks of a docstring along with their compiled code
+    objects.
+    """
+
+    def __init__(self, docstring):
         parser = doctest.DocTestParser()
-        parser = parser.parse(docstring)
         self.preludes = {}
         self.wants = {}
+        self.exc_msgs = {}
         self.src_blocks = []
         index = 0
-        for item in parser:
-            if isinstance(item, basestring):
+        for item in parser.parse(docstring):
+            if isinstance(item, str):
                 self.preludes[index] = item
             else:
                 self.src_blocks.append(item.source)
                 if item.want != '':
                     self.wants[index] = item.want
+                if item.exc_msg is not None:
+                    self.exc_msgs[index] = item.exc_msg
                 index += 1
+
+        # Map source strings to their compiled code objects.
+        self.codes = {}
+
+    def compile(self, source):
+        """ Return the compiled code object for a block's source.
+        """
+        code = self.codes.get(source)
+        if code is None:
+            code = compile(source, '<string>', 'single')
+            self.codes[source] = code
+        return code
+
+
+# Map the SHA1 hashes of docstrings to their ParsedDocstrings, least recently
+# used first.
+_parsed_docstrings = OrderedDict()
+
+# The most ParsedDocstrings to keep in the cache.
+PARSED_DOCSTRINGS_SIZE = 256
+
+
+def parse_docstring(docstring):
+    """ Return the cached ParsedDocstring for the given docstring.
+    """
+    if isinstance(docstring, bytes):
+        key = hashlib.sha1(docstring).hexdigest()
+    else:
+        key = hashlib.sha1(docstring.encode('utf-8')).hexdigest()
+    parsed = _parsed_docstrings.pop(key, None)
+    if parsed is None:
+        parsed = ParsedDocstring(docstring)
+    _parsed_docstrings[key] = parsed
+    while len(_parsed_docstrings) > PARSED_DOCSTRINGS_SIZE:
+        _parsed_docstrings.popitem(last=False)
+    return parsed
+
+
+class DoctestDemo(demo.IPythonDemo):
+    """ Extract doctest blocks for demo purposes.
+
+    The examples are run in a fresh copy of `seed_ns`, or of the IPython
+    namespace if it is not given.
+    """
+
+    def __init__(self, src, seed_ns=None, **kwds):
+        self.seed_ns = seed_ns
+        super(DoctestDemo, self).__init__(src, **kwds)
+
+    def reset(self):
+        """Reset the namespace and seek pointer to restart the demo"""
+        self.user_ns = {}
+        if self.seed_ns is None:
+            self.user_ns.update(self.ip_ns)
+        else:
+            self.user_ns.update(self.seed_ns)
+        # There is nothing to run in a docstring without examples.
+        self.finished = self.nblocks == 0
+        self.block_index = 0
+
+    def reload(self):
+        """ Reload source and initialize state.
+        """
+        self.fload()
+        docstring = self.fobj.read()
+        self.parsed = parse_docstring(docstring)
+        # Copy the containers so edits to this demo do not leak into the cache.
+        self.preludes = dict(self.parsed.preludes)
+        self.wants = dict(self.parsed.wants)
+        self.src_blocks = list(self.parsed.src_blocks)
         self.src = ''.join(self.src_blocks)
         nblocks = len(self.src_blocks)
         self._silent = [False]*nblocks
@@ -86,23 +386,40 @@ class DoctestDemo(demo.IPythonDemo):
         self.auto_all = False
         self.nblocks = nblocks
 
-        # also build syntax-highlighted source
-        self.src_blocks_colored = map(self.ip_colorize, self.src_blocks)
+        # The syntax-highlighted source is built lazily by show().
+        self._src_blocks_colored = [None]*nblocks
 
         # ensure clean namespace and seek offset
         self.reset()
 
+    @property
+    def src_blocks_colored(self):
+        """ The syntax-highlighted source of all of the blocks.
+        """
+        for index in range(self.nblocks):
+            self.colored_block(index)
+        return self._src_blocks_colored
+
+    def colored_block(self, index):
+        """ Return the syntax-highlighted source of a single block.
+        """
+        colored = self._src_blocks_colored[index]
+        if colored is None:
+            colored = self.ip_colorize(self.src_blocks[index])
+            self._src_blocks_colored[index] = colored
+        return colored
+
     def displayhook(self, obj):
         """ Simple displayhook.
         """
         if obj is not None:
-            print('output:', file=io.stdout)
-            print(repr(obj), file=io.stdout)
+            print('output:')
+            print(repr(obj))
 
     def runlines(self, source):
         """ Execute a string with one or more lines of code.
         """
-        code = compile(source, '<string>', 'single')
+        code = self.parsed.compile(source)
         oldhook = sys.displayhook
         sys.displayhook = self.displayhook
         try:
@@ -110,6 +427,107 @@ class DoctestDemo(demo.IPythonDemo):
         finally:
             sys.displayhook = oldhook
 
+    def run_batch(self, memory=True):
+        """ Run all of the remaining blocks without pausing and check their
+        output against the expected output.
+
+        If `memory` is True, the peak memory of each block is measured with
+        tracemalloc. Tracing slows down allocation, so the wall times then
+        include its overhead; pass False for clean timings.
+
+        Returns a list of ExampleResults.
+        """
+        import tracemalloc
+        started_tracing = memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        checker = doctest.OutputChecker()
+        results = []
+        try:
+            while self.block_index < self.nblocks:
+                index = self.block_index
+                source = self.src_blocks[index]
+                want = self.wants.get(index, '')
+                got, exc_msg, elapsed, peak = self._run_block_captured(
+                    source, memory, started_tracing)
+                if exc_msg is None:
+                    matched = checker.check_output(want, got, doctest.ELLIPSIS)
+                else:
+                    # Like doctest, only compare the exception message.
+                    expected_msg = self.parsed.exc_msgs.get(index)
+                    matched = (expected_msg is not None and
+                               checker.check_output(expected_msg, exc_msg,
+                                                    doctest.ELLIPSIS))
+                    got += u'Traceback (most recent call last):\n  ...\n'
+                    got += exc_msg
+                results.append(ExampleResult(self.title, index, source, want,
+                                             got, matched, elapsed, peak))
+                self.block_index += 1
+            self.finished = True
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        if self.seed_ns is None:
+            self.ip_ns.update(self.user_ns)
+        return results
+
+    def _run_block_captured(self, source, memory, clear_traces):
+        """ Run a block, capturing its output, exception message (or None),
+        wall time and peak memory (or None if `memory` is False).
+
+        Neither the time nor the memory includes compiling the block. The
+        traces are only cleared if `clear_traces` is True, i.e. when we
+        started tracing ourselves. Otherwise only the peak is reset so that
+        the user's own traces survive.
+        """
+        import tracemalloc
+        stream = StringIO()
+        oldstdout = sys.stdout
+        oldhook = sys.displayhook
+        sys.stdout = stream
+        sys.displayhook = self._batch_displayhook
+        exc_msg = None
+        elapsed = 0.0
+        peak = 0 if memory else None
+        try:
+            try:
+                code = self.parsed.compile(source)
+            except Exception:
+                # A SyntaxError is reported like any other failed example.
+                code = None
+                exc_msg = self._format_exc_msg()
+            if code is not None:
+                if memory:
+                    if clear_traces:
+                        tracemalloc.clear_traces()
+                    else:
+                        tracemalloc.reset_peak()
+                    baseline = tracemalloc.get_traced_memory()[0]
+                start = default_timer()
+                try:
+                    exec(code, self.user_ns)
+                except Exception:
+                    exc_msg = self._format_exc_msg()
+                elapsed = default_timer() - start
+                if memory:
+                    peak = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            sys.stdout = oldstdout
+            sys.displayhook = oldhook
+        return stream.getvalue(), exc_msg, elapsed, peak
+
+    def _format_exc_msg(self):
+        """ Format the exception being handled the way doctest compares it.
+        """
+        exc_type, exc_value = sys.exc_info()[:2]
+        return traceback.format_exception_only(exc_type, exc_value)[-1]
+
+    def _batch_displayhook(self, obj):
+        """ Print the repr of results the way the doctest prompt would.
+        """
+        if obj is not None:
+            print(repr(obj))
+
     def show(self, index=None):
         """ Show a single block on screen.
         """
@@ -117,14 +535,14 @@ class DoctestDemo(demo.IPythonDemo):
         if index is None:
             return
         if index in self.preludes:
-            print(self.preludes[index], file=io.stdout)
-        lines = self.src_blocks_colored[index].splitlines()
+            print(self.preludes[index])
+        lines = self.colored_block(index).splitlines()
         lines[0] = '>>> ' + lines[0]
         for i in range(1, len(lines)):
             lines[i] = '... ' + lines[i]
-        print(''.join(lines), file=io.stdout)
+        print(''.join(lines))
         if index in self.wants:
-            print(self.wants[index], file=io.stdout)
+            print(self.wants[index])
         sys.stdout.flush()
 
     # These methods are meant to be overridden by subclasses who may wish to
@@ -135,6 +553,191 @@ class DoctestDemo(demo.IPythonDemo):
         return txt
 
 
+def find_example_docstrings(package):
+    """ Find all of the docstrings with doctest examples under a module tree.
+
+    Returns a list of (module name, object name, docstring) tuples and a list
+    of messages about the modules that could not be imported or searched.
+    """
+    import pkgutil
+    failed = []
+    modules = [package]
+    if hasattr(package, '__path__'):
+        def onerror(name):
+            exc_type, exc_value = sys.exc_info()[:2]
+            failed.append('Could not import %s: %s: %s' % (
+                name, exc_type.__name__, exc_value))
+        for _, name, _ in pkgutil.walk_packages(
+                package.__path__, package.__name__ + '.', onerror=onerror):
+            try:
+                modules.append(importlib.import_module(name))
+            except Exception as e:
+                failed.append('Could not import %s: %s: %s' % (
+                    name, type(e).__name__, e))
+    finder = doctest.DocTestFinder()
+    tasks = []
+    for module in modules:
+        try:
+            tests = finder.find(module)
+        except Exception as e:
+            failed.append('Could not find the examples in %s: %s: %s' % (
+                module.__name__, type(e).__name__, e))
+            continue
+        for test in tests:
+            if test.examples:
+                tasks.append((module.__name__, test.name, test.docstring))
+    return tasks, failed
+
+
+def run_docstring_examples(task, memory=True):
+    """ Run the examples in one docstring in batch mode.
+
+    This is run in the worker processes of %run_examples --recursive. The
+    examples are run in a fresh copy of the defining module's namespace.
+
+    This never raises. If the examples cannot be run at all, a single failed
+    result describing the error is returned instead.
+    """
+    module_name, name, docstring = task
+    try:
+        module = importlib.import_module(module_name)
+        d = DoctestDemo(StringIO(docstring), seed_ns=vars(module), title=name)
+        return d.run_batch(memory=memory)
+    except Exception:
+        exc_type, exc_value = sys.exc_info()[:2]
+        got = u'Could not run the examples:\n' + u''.join(
+            traceback.format_exception_only(exc_type, exc_value))
+        return [ExampleResult(name, 0, '', '', got, False, 0.0,
+                              0 if memory else None)]
+
+
+# Where %lambdify keeps the generated source of compiled functions.
+LAMBDIFY_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache',
+                                  'kernmagic', 'lambdify')
+
+# Map the %lambdify cache keys to their compiled functions.
+_lambdified = {}
+
+
+def lambdify_key(expr, args, backend, cse):
+    """ Return the cache key for a lambdified expression.
+
+    The key is a hash of the structure of the expression and arguments (their
+    srepr), the backend, whether common subexpressions are eliminated, and the
+    sympy version, since that determines the generated code.
+    """
+    import sympy
+    text = '\n'.join([sympy.__version__, backend, repr(bool(cse)),
+                      sympy.srepr(args), sympy.srepr(expr)])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _global_names(code):
+    """ Return the global names that a code object and the code nested in it
+    look up.
+    """
+    import dis
+    names = set()
+    for instr in dis.get_instructions(code):
+        if instr.opname in ('LOAD_GLOBAL', 'LOAD_NAME'):
+            names.add(instr.argval)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.update(_global_names(const))
+    return names
+
+
+def _symbol_names(args):
+    """ Return the names of the symbols in possibly nested lambdify arguments.
+    """
+    if isinstance(args, (list, tuple)):
+        names = set()
+        for arg in args:
+            names.update(_symbol_names(arg))
+        return names
+    return set([str(args)])
+
+
+def _load_lambdified(filename, namespace):
+    """ Load a function saved by cached_lambdify(), or return None if it is
+    missing or would refer to names that are not in the namespace.
+    """
+    with open(filename) as f:
+        source = f.read()
+    try:
+        exec(compile(source, filename, 'exec'), namespace)
+    except Exception:
+        return None
+    func = namespace.get('_lambdifygenerated')
+    if func is None:
+        return None
+    builtins = namespace.get('__builtins__', {})
+    if not isinstance(builtins, dict):
+        builtins = vars(builtins)
+    for name in _global_names(func.__code__):
+        if name not in namespace and name not in builtins:
+            return None
+    linecache.cache[filename] = (
+        len(source), None, [x+'\n' for x in source.splitlines()], filename)
+    return func
+
+
+def cached_lambdify(expr, args, backend='numpy', cse=False,
+                    cache_dir=LAMBDIFY_CACHE_DIR):
+    """ Lambdify an expression, reusing previously compiled functions from
+    memory or from the generated source saved in `cache_dir`.
+
+    Only functions which need nothing but the backend's namespace are saved to
+    disk; expressions with e.g. implemented_function()s are only cached in
+    memory.
+
+    Returns the function and where it came from: 'memory', 'disk' or
+    'compiled'.
+    """
+    import sympy
+    key = lambdify_key(expr, args, backend, cse)
+    func = _lambdified.get(key)
+    if func is not None:
+        return func, 'memory'
+
+    filename = None
+    if cache_dir is not None:
+        filename = os.path.join(cache_dir, key + '.py')
+        # The backend's namespace, recreated from a trivial function.
+        base_ns = sympy.lambdify([], 0, modules=backend).__globals__
+    if filename is not None and os.path.exists(filename):
+        func = _load_lambdified(filename, dict(base_ns))
+        if func is not None:
+            _lambdified[key] = func
+            return func, 'disk'
+        # The file cannot be used, so compile it again.
+        os.remove(filename)
+
+    if cse:
+        func = sympy.lambdify(args, expr, modules=backend, cse=True)
+    else:
+        func = sympy.lambdify(args, expr, modules=backend)
+    if filename is not None:
+        # lambdify also adds the argument symbols to the namespace, but the
+        # generated code does not use them.
+        extra = set(func.__globals__) - set(base_ns) - _symbol_names(args)
+        try:
+            source = inspect.getsource(func)
+        except (IOError, TypeError):
+            source = None
+        if source is not None and not extra:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # Write to a temporary file first so that a concurrent reader
+            # never sees a partial file.
+            fd, tmpname = tempfile.mkstemp('.py', key, cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                f.write(source)
+            os.replace(tmpname, filename)
+    _lambdified[key] = func
+    return func, 'compiled'
+
+
 @magics_class
 class KernMagics(Magics):
     """ Loose collection of my own magics.
@@ -155,8 +758,8 @@ class KernMagics(Magics):
 
     @magic_arguments()
     @argument('-e', '--encoding', default='utf-8',
-              help=("the encoding to use for unicode objects; no effect on "
-                    "str objects [default: %(default)s]"))
+              help=("the encoding to use for text; no effect on bytes "
+                    "objects written in binary mode [default: %(default)s]"))
     @argument('-m', '--mode', default='wb',
               help="the file mode to use when opening the file for writing")
     @argument('variable', help="the name of the variable")
@@ -173,12 +776,16 @@ class KernMagics(Magics):
         filename = os.path.expanduser(args.filename)
 
         obj = self.get_variable(args.variable)
-        if isinstance(obj, unicode):
-            obj = obj.encode(args.encoding)
-        elif not isinstance(obj, str):
+        if not isinstance(obj, (bytes, type(u''))):
             obj = str(obj)
-
-        f = open(filename, args.mode)
+        if 'b' in args.mode or bytes is str:
+            if not isinstance(obj, bytes):
+                obj = obj.encode(args.encoding)
+            f = open(filename, args.mode)
+        else:
+            if isinstance(obj, bytes):
+                obj = obj.decode(args.encoding)
+            f = open(filename, args.mode, encoding=args.encoding)
         f.write(obj)
         f.close()
 
@@ -197,14 +804,82 @@ class KernMagics(Magics):
     """
         args = parse_argstring(self.fread, arg)
         filename = os.path.expanduser(args.filename)
-        f = open(filename, args.mode)
+        if 'b' in args.mode or bytes is str:
+            f = open(filename, args.mode)
+        else:
+            f = open(filename, args.mode, encoding=args.encoding)
         contents = f.read()
         f.close()
-        if args.encoding:
+        if args.encoding and isinstance(contents, bytes):
             contents = contents.decode(args.encoding)
 
         self.shell.user_ns[args.variable] = contents
 
+    @magic_arguments()
+    @argument('-u', '--unshare', action='store_true',
+              help="Stop sharing the variable and free its shared memory.")
+    @argument('-l', '--list', action='store_true',
+              help="List the shared and attached variables.")
+    @argument('variable', nargs='?', help="The name of the variable.")
+    @argument('name', nargs='?',
+              help=("The name to share it under, made of letters, digits "
+                    "and underscores [default: the variable's name]."))
+    @line_magic
+    def share(self, arg):
+        """ Share an array or other buffer with other kernels on this machine
+        through shared memory.
+
+    The data is copied into shared memory once. Other kernels map it without
+    copying with %attach. It is freed when this kernel exits.
+    """
+        from kernmagic.sharing import SharedVariables
+        args = parse_argstring(self.share, arg)
+        shared = SharedVariables.singleton(self.shell)
+        if args.list:
+            shared.print_status()
+            return
+        if args.variable is None:
+            raise UsageError("a variable is required")
+        if args.name is None:
+            args.name = args.variable
+        try:
+            if args.unshare:
+                if args.name not in shared.published:
+                    raise ValueError("%r is not shared" % args.name)
+                shared.unpublish(args.name)
+            else:
+                shared.publish(self.get_variable(args.variable), args.name)
+        except ValueError as e:
+            raise UsageError(str(e))
+
+    @magic_arguments()
+    @argument('-d', '--detach', action='store_true',
+              help="Forget about a variable that was attached.")
+    @argument('name', help="The name the variable was shared under.")
+    @argument('variable', nargs='?',
+              help="The name of the variable [default: the shared name].")
+    @line_magic
+    def attach(self, arg):
+        """ Map a variable shared by another kernel with %share into this
+        namespace without copying it.
+
+    """
+        from kernmagic.sharing import SharedVariables
+        args = parse_argstring(self.attach, arg)
+        shared = SharedVariables.singleton(self.shell)
+        try:
+            if args.detach:
+                if args.name not in shared.attached:
+                    raise ValueError("%r is not attached" % args.name)
+                shared.detach(args.name)
+                return
+            obj = shared.attach(args.name)
+        except ValueError as e:
+            raise UsageError(str(e))
+        if args.variable is None:
+            args.variable = args.name
+        self.shell.user_ns[args.variable] = obj
+
     @magic_arguments()
     @argument('-r', '--real', action='store_const', dest='kind',
               const='real', help="symbols are real variables")
@@ -214,10 +889,19 @@ class KernMagics(Magics):
               const='complex', help="symbols are complex variables")
     @argument('-f', '--function', action='store_const', dest='kind',
               const='function', help="symbols are functions")
+    @argument('-a', '--array', action='store_const', dest='group',
+              const='array',
+              help=("bind each range or shape as a single numpy object array "
+                    "instead of individual variables"))
+    @argument('-m', '--matrix', action='store_const', dest='group',
+              const='matrix',
+              help=("bind each range or shape as a single sympy Matrix "
+                    "instead of individual variables"))
     @argument('-q', '--quiet', action='store_true',
               help="do not print out verbose information")
     @argument('names', nargs='+',
-              help="the names of the variables to create")
+              help=("the names of the variables to create; x0:1000 creates "
+                    "x0 through x999 and A[3,3] creates A_0_0 through A_2_2"))
     @line_magic
     def sym(self, arg):
         """ Create Sympy variables easily.
@@ -228,28 +912,96 @@ class KernMagics(Magics):
         except ImportError:
             raise UsageError("could not import sympy.")
         args = parse_argstring(self.sym, arg)
-        factory = sympy.Symbol
-        kwds = {}
-        if args.kind == 'integer':
-            kwds = dict(integer=True)
-        elif args.kind == 'real':
-            kwds = dict(real=True)
-        elif args.kind == 'complex':
-            kwds = dict(complex=True)
-        elif args.kind == 'function':
+        if args.kind == 'function' and args.group == 'matrix':
+            raise UsageError("functions cannot be put in a Matrix; use "
+                             "--array instead.")
+        if args.kind == 'function':
             factory = sympy.Function
+        else:
+            factory = sympy.Symbol
+        kwds = SYMBOL_ASSUMPTIONS[args.kind]
+
+        new_vars = {}
+        labels = []
+        for spec in args.names:
+            bind_name, shape, names, label = expand_symbol_names(str(spec))
+            symbols = [factory(name, **kwds) for name in names]
+            if shape is None or args.group is None:
+                new_vars.update(zip(names, symbols))
+            elif args.group == 'array':
+                try:
+                    import numpy
+                except ImportError:
+                    raise UsageError("could not import numpy.")
+                arr = numpy.empty(len(symbols), dtype=object)
+                arr[:] = symbols
+                new_vars[bind_name] = arr.reshape(shape)
+                label = '%s = %s' % (bind_name, label)
+            else:
+                if len(shape) > 2:
+                    raise UsageError("a Matrix must have at most 2 "
+                                     "dimensions: %s" % spec)
+                new_vars[bind_name] = sympy.Matrix(
+                    shape[0], (shape + (1,))[1], symbols)
+                label = '%s = %s' % (bind_name, label)
+            labels.append(label)
+        self.shell.user_ns.update(new_vars)
 
         if not args.quiet:
             if args.kind is not None:
                 print('Adding %s variables:' % args.kind)
             else:
                 print('Adding variables:')
-        for name in args.names:
-            name = name.encode('ascii')
-            var = factory(name, **kwds)
-            self.shell.user_ns[name] = var
-            if not args.quiet:
-                print('  %s' % name)
+            print(utils.columnize(labels))
+
+    @magic_arguments()
+    @argument('-c', '--cse', action='store_true',
+              help="eliminate common subexpressions")
+    @argument('-b', '--backend', default='numpy',
+              help=("the module to generate code for "
+                    "[default: %(default)s]"))
+    @argument('-n', '--no-disk-cache', action='store_true',
+              help="do not read or write the on-disk cache")
+    @argument('-q', '--quiet', action='store_true',
+              help="do not print where the function came from")
+    @argument('variable', help="the name of the variable for the function")
+    @argument('expression', help="the sympy expression")
+    @argument('args', nargs='+',
+              help="the symbols that are the arguments of the function")
+    @line_magic
+    def lambdify(self, arg):
+        """ Compile a sympy expression into a vectorized numeric function.
+
+    """
+        try:
+            import sympy
+        except ImportError:
+            raise UsageError("could not import sympy.")
+        args = parse_argstring(self.lambdify, arg)
+        expr = sympy.sympify(self.get_variable(args.expression))
+        func_args = []
+        for name in args.args:
+            value = self.get_variable(name)
+            if hasattr(value, 'tolist'):
+                # Arrays and Matrices of symbols from %sym.
+                value = value.tolist()
+            func_args.append(value)
+        if args.no_disk_cache:
+            cache_dir = None
+        else:
+            cache_dir = LAMBDIFY_CACHE_DIR
+        try:
+            func, origin = cached_lambdify(expr, func_args, args.backend,
+                                           args.cse, cache_dir)
+        except (ImportError, NameError, TypeError) as e:
+            raise UsageError("could not lambdify %s: %s" % (args.expression,
+                                                            e))
+        self.shell.user_ns[args.variable] = func
+        if not args.quiet:
+            if origin == 'compiled':
+                print('Compiled %s.' % args.variable)
+            else:
+                print('Loaded %s from the %s cache.' % (args.variable, origin))
 
     @magic_arguments()
     @argument('-p', '--precision', type=int,
@@ -274,6 +1026,10 @@ class KernMagics(Magics):
               help="String representation of floating point not-a-number.")
     @argument('-i', '--infstr',
               help="String representation of floating point infinity.")
+    @argument('-b', '--budget', type=float, metavar='MS',
+              help=("Display arrays with a formatter that falls back to a "
+                    "summary when rendering the full repr would take longer "
+                    "than MS milliseconds. 0 removes the formatter."))
     @argument('-q', '--quiet', action='store_true',
               help="Do not print the new settings.")
     @line_magic
@@ -291,7 +1047,7 @@ class KernMagics(Magics):
             kwds['precision'] = args.precision
         if args.threshold is not None:
             if args.threshold == 0:
-                args.threshold = sys.maxint
+                args.threshold = sys.maxsize
             kwds['threshold'] = args.threshold
         if args.edgeitems is not None:
             kwds['edgeitems'] = args.edgeitems
@@ -306,8 +1062,16 @@ class KernMagics(Magics):
 
         old_options = numpy.get_printoptions()
         numpy.set_printoptions(**kwds)
+        plain = self.shell.display_formatter.formatters['text/plain']
+        if args.budget is None:
+            old_formatter = None
+        elif args.budget > 0:
+            old_formatter = plain.for_type(numpy.ndarray,
+                                           BudgetedArrayFormatter(args.budget))
+        else:
+            old_formatter = plain.type_printers.pop(numpy.ndarray, None)
         stack = getattr(self, '_numpy_printoptions_stack', [])
-        stack.append(old_options)
+        stack.append((old_options, args.budget is not None, old_formatter))
         self._numpy_printoptions_stack = stack
         if not args.quiet:
             print_numpy_printoptions(numpy.get_printoptions())
@@ -328,8 +1092,14 @@ class KernMagics(Magics):
 
         stack = getattr(self, '_numpy_printoptions_stack', [])
         if stack:
-            kwds = stack.pop()
+            kwds, pushed_formatter, old_formatter = stack.pop()
             numpy.set_printoptions(**kwds)
+            if pushed_formatter:
+                plain = self.shell.display_formatter.formatters['text/plain']
+                if old_formatter is None:
+                    plain.type_printers.pop(numpy.ndarray, None)
+                else:
+                    plain.for_type(numpy.ndarray, old_formatter)
         elif not args.quiet:
             print("At the end of the stack.\n")
         self._numpy_printoptions_stack = stack
@@ -353,6 +1123,9 @@ class KernMagics(Magics):
                     "mode."))
     @argument('-n', '--no-call-func', action='store_true',
               help="Remove any existing call function.")
+    @argument('-s', '--sample', type=int, default=16,
+              help=("Capture the calling source line of every Nth error in "
+                    "the 'count' mode [default: %(default)s]."))
     @argument('-q', '--quiet', action='store_true',
               help="Do not print the new settings.")
     @line_magic
@@ -374,7 +1147,17 @@ class KernMagics(Magics):
             value = getattr(args, key)
             if value is not None:
                 kwds[key] = value
-        if args.call_func is not None:
+        if 'count' in kwds.values():
+            if args.call_func is not None or args.no_call_func:
+                raise UsageError(
+                    "You cannot specify a --call-func or --no-call-func "
+                    "with the 'count' mode.")
+            # The 'count' mode is the 'call' mode with an ErrorCounter.
+            for key, value in kwds.items():
+                if value == 'count':
+                    kwds[key] = 'call'
+            errcall = ErrorCounter(args.sample)
+        elif args.call_func is not None:
             if args.no_call_func:
                 raise UsageError(
                     "You cannot specify both a --call-func and "
@@ -421,15 +1204,41 @@ class KernMagics(Magics):
 
         stack = getattr(self, '_numpy_err_stack', [])
         if stack:
+            counter = numpy.geterrcall()
             kwds, errcall = stack.pop()
             numpy.seterr(**kwds)
             numpy.seterrcall(errcall)
+            if (isinstance(counter, ErrorCounter) and counter is not errcall
+                    and not args.quiet):
+                print(counter.report())
+                print('')
         elif not args.quiet:
             print("At the end of the stack.\n")
         self._numpy_err_stack = stack
         if not args.quiet:
             print_numpy_err(numpy.geterr(), numpy.geterrcall())
 
+    @magic_arguments()
+    @argument('-n', '--top', type=int, default=10,
+              help=("The number of source lines to report "
+                    "[default: %(default)s]."))
+    @line_magic
+    def err_report(self, arg):
+        """ Report the floating point errors counted by the current 'count'
+        mode of %push_err.
+
+    """
+        try:
+            import numpy
+        except ImportError:
+            raise UsageError("could not import numpy.")
+        args = parse_argstring(self.err_report, arg)
+        counter = numpy.geterrcall()
+        if not isinstance(counter, ErrorCounter):
+            raise UsageError("The 'count' mode is not active. Use "
+                             "%push_err with 'count' first.")
+        print(counter.report(top=args.top))
+
     @magic_arguments()
     @argument('-n', '--no-group', dest='group', action='store_false',
               help="Do not group by the defining class.")
@@ -519,21 +1328,74 @@ class KernMagics(Magics):
             print(utils.columnize(all))
 
     @magic_arguments()
+    @argument('-v', '--versioned', action='store_true',
+              help=("Use a built-in VersionedNamespace, which tracks changes "
+                    "with less overhead than a DataContext, instead. It is "
+                    "also the globals of functions defined in the shell. "
+                    "Being a dict subclass, it is still slower than the "
+                    "plain dict: in benchmarks/bench_namespace.py, name "
+                    "lookups in cells are about 4x slower, global lookups in "
+                    "functions about 6x slower, and assignments in cells "
+                    "about 12x slower."))
     @line_magic
     def replace_context(self, parameter_s=''):
-        """Replace the IPython namespace with a DataContext.
+        """Replace the IPython namespace with one that tracks changes.
 
+    The namespace is a DataContext, or a VersionedNamespace given --versioned.
+    Run it again to toggle back to the original namespace, keeping any changes
+    made in the meantime.
     """
+        from kernmagic.namespace import VersionedNamespace
+        args = parse_argstring(self.replace_context, parameter_s)
         ipshell = self.shell
         if hasattr(ipshell.user_ns, 'subcontext'):
             # Toggle back to plain dict.
             user_ns = ipshell.user_ns.subcontext
+        elif isinstance(ipshell.user_ns, VersionedNamespace):
+            # Toggle back to the original dict and module, bringing along any
+            # changes.
+            versioned = ipshell.user_ns
+            ipshell.events.unregister('post_execute', versioned.flush)
+            user_ns, user_module = self._replaced_namespace
+            del self._replaced_namespace
+            user_ns.clear()
+            user_ns.update(versioned)
+            ipshell.user_module = user_module
+        elif args.versioned:
+            from IPython.core.interactiveshell import DummyMod
+            self._replaced_namespace = (ipshell.user_ns, ipshell.user_module)
+            user_ns = VersionedNamespace(ipshell.user_ns)
+            # Also use it as the module globals so that functions defined in
+            # the shell see the same namespace.
+            user_module = DummyMod()
+            user_module.__dict__ = user_ns
+            ipshell.user_module = user_module
+            # Notify listeners of the changes once per cell.
+            ipshell.events.register('post_execute', user_ns.flush)
         else:
             from codetools.contexts.api import DataContext
             user_ns = DataContext(subcontext=ipshell.user_ns)
         ipshell.user_ns = user_ns
 
     @magic_arguments()
+    @argument('-b', '--batch', action='store_true',
+              help=("Run all of the examples without pausing, check their "
+                    "output, and report timings and peak memory. The "
+                    "timings include the overhead of tracing memory with "
+                    "tracemalloc unless --no-memory is given."))
+    @argument('-M', '--no-memory', action='store_true',
+              help=("Do not trace memory in batch mode, for timings without "
+                    "tracemalloc's overhead."))
+    @argument('-n', '--top', type=int, default=10,
+              help=("The number of slowest examples to report in batch mode "
+                    "[default: %(default)s]."))
+    @argument('-r', '--recursive', action='store_true',
+              help=("Treat the object as the name of a module or package and "
+                    "run the examples in every docstring under it in batch "
+                    "mode, in parallel."))
+    @argument('-j', '--jobs', type=int,
+              help=("The number of worker processes for --recursive "
+                    "[default: the number of CPUs]."))
     @argument('object', help="The name of the object.")
     @line_magic
     def run_examples(self, arg):
@@ -541,13 +1403,53 @@ class KernMagics(Magics):
 
     """
         args = parse_argstring(self.run_examples, arg)
+        if args.recursive:
+            self._run_examples_recursive(args)
+            return
         obj = self.get_variable(args.object)
         if not hasattr(obj, '__doc__'):
             raise UsageError("%s does not have a docstring" % args.object)
-        d = DoctestDemo(StringIO(obj.__doc__))
+        d = DoctestDemo(StringIO(obj.__doc__), title=args.object)
+        if args.batch:
+            results = d.run_batch(memory=not args.no_memory)
+            print_example_report(results, top=args.top)
+            return
         while not d.finished:
             d()
 
+    def _run_examples_recursive(self, args):
+        """ Run all of the examples under a module tree in a process pool.
+        """
+        import multiprocessing
+        try:
+            package = importlib.import_module(args.object)
+        except ImportError as e:
+            raise UsageError("could not import %s: %s" % (args.object, e))
+        tasks, failed = find_example_docstrings(package)
+        for message in failed:
+            print(message)
+        if not tasks:
+            print("No examples found under %s." % args.object)
+            return
+
+        start = default_timer()
+        pool = multiprocessing.Pool(args.jobs)
+        try:
+            results = []
+            run = functools.partial(run_docstring_examples,
+                                    memory=not args.no_memory)
+            for task_results in pool.imap_unordered(run, tasks):
+                results.extend(task_results)
+        finally:
+            pool.terminate()
+            pool.join()
+        wall = default_timer() - start
+        results.sort(key=lambda r: (r.name, r.index))
+        print_example_report(results, top=args.top)
+        print('')
+        print('Checked %d docstrings in %.3f s of wall time.' % (
+            len(tasks), wall))
+
     @magic_arguments()
     @argument('-d', '--dump', action='store_true',
               help="Dump the current sources.")
@@ -0,0 +1,93 @@
+""" A change-tracking namespace for the IPython shell.
+"""
+
+from collections import defaultdict
+
+
+class VersionedNamespace(dict):
+    """ A dict that counts the number of times each key has been changed.
+
+    Only the mutating methods are overridden, so lookups never run Python
+    code. Changes are recorded cheaply as they happen and listeners are
+    notified of all of the keys changed since the last notification, in one
+    batch, when flush() is called (e.g. after each cell is executed).
+    """
+
+    def __init__(self, *args, **kwds):
+        dict.__init__(self, *args, **kwds)
+        # Map keys to the number of times they have been set or deleted.
+        self.versions = defaultdict(int)
+        # The keys changed since the last flush().
+        self.changed = set()
+        # Callables that will be given the set of changed keys.
+        self.listeners = []
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.versions[key] += 1
+        self.changed.add(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.versions[key] += 1
+        self.changed.add(key)
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+    def _touch(self, keys):
+        """ Record changes to several keys at once.
+        """
+        versions = self.versions
+        for key in keys:
+            versions[key] += 1
+        self.changed.update(keys)
+
+    def update(self, *args, **kwds):
+        other = dict(*args, **kwds)
+        dict.update(self, other)
+        self._touch(other)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def pop(self, key, *default):
+        had_key = key in self
+        value = dict.pop(self, key, *default)
+        if had_key:
+            self._touch([key])
+        return value
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self._touch([key])
+        return key, value
+
+    def clear(self):
+        keys = list(self)
+        dict.clear(self)
+        self._touch(keys)
+
+    def copy(self):
+        return type(self)(self)
+
+    def version(self, key):
+        """ Return the number of times the key has been changed.
+        """
+        return self.versions.get(key, 0)
+
+    def flush(self):
+        """ Notify the listeners of the keys changed since the last flush.
+        """
+        if not self.changed:
+            return
+        changed = frozenset(self.changed)
+        self.changed.clear()
+        for listener in list(self.listeners):
+            listener(changed)
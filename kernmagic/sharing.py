@@ -0,0 +1,292 @@
+""" Share buffer-protocol objects between kernels through shared memory.
+"""
+
+from __future__ import print_function
+
+import atexit
+import json
+import re
+import struct
+import sys
+import weakref
+
+
+# Shared memory blocks are named with this prefix so that kernmagic's blocks
+# do not collide with anyone else's.
+PREFIX = 'kernmagic_'
+
+# The header of each block: a magic string and the length of the JSON
+# metadata that follows it.
+HEADER = struct.Struct('<4sI')
+MAGIC = b'KMSH'
+
+# The data starts at a multiple of this many bytes.
+ALIGNMENT = 64
+
+# The names variables can be shared under. macOS limits the names of shared
+# memory blocks to 31 characters, including a leading slash and the prefix.
+NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+if sys.platform == 'darwin':
+    MAX_NAME_LENGTH = 30 - len(PREFIX)
+else:
+    MAX_NAME_LENGTH = 200
+
+
+def check_name(name):
+    """ Raise a ValueError unless the name can be used to share a variable.
+    """
+    if not NAME_RE.match(name):
+        raise ValueError("%r is not a valid name to share under; use letters, "
+                         "digits and underscores" % name)
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError("%r is too long to share under; use at most %d "
+                         "characters" % (name, MAX_NAME_LENGTH))
+
+
+def _data_offset(metadata_len):
+    """ Return the offset of the data after a header with the given amount of
+    metadata.
+    """
+    end = HEADER.size + metadata_len
+    return (end + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+# The SharedMemory subclass returned by _shared_memory_class().
+_SharedMemory = None
+
+
+def _shared_memory_class():
+    """ Return a SharedMemory subclass that stays quiet if it is garbage
+    collected, e.g. at exit, while arrays or memoryviews still use its mapping.
+    The mapping is then unmapped when the last of them is gone.
+    """
+    global _SharedMemory
+    if _SharedMemory is None:
+        from multiprocessing import shared_memory
+
+        class SharedMemory(shared_memory.SharedMemory):
+            def __del__(self):
+                try:
+                    self.close()
+                except (BufferError, OSError):
+                    pass
+        _SharedMemory = SharedMemory
+    return _SharedMemory
+
+
+def _open_untracked(name):
+    """ Open an existing shared memory block without letting the
+    resource_tracker unlink it when this process exits. The publishing kernel
+    owns the block.
+    """
+    SharedMemory = _shared_memory_class()
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    shm = SharedMemory(name=name)
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def read_metadata(shm, name):
+    """ Return the metadata of a block and the offset of its data.
+    """
+    magic, metadata_len = HEADER.unpack_from(shm.buf, 0)
+    if magic != MAGIC:
+        raise ValueError("%r is not a kernmagic shared variable" % name)
+    encoded = bytes(shm.buf[HEADER.size:HEADER.size + metadata_len])
+    try:
+        metadata = json.loads(encoded.decode('utf-8'))
+    except ValueError:
+        raise ValueError("%r has corrupt metadata" % name)
+    return metadata, _data_offset(metadata_len)
+
+
+def describe(obj):
+    """ Return the metadata and a contiguous memoryview of the bytes of an
+    object to share.
+    """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None and isinstance(obj, numpy.generic):
+        # Share scalars as 0-d arrays so that they come back as numpy values.
+        obj = numpy.asarray(obj)
+    if numpy is not None and isinstance(obj, numpy.ndarray):
+        if obj.dtype.hasobject:
+            raise ValueError("arrays of Python objects cannot be shared")
+        from numpy.lib.format import dtype_to_descr
+        fortran_order = (obj.flags.f_contiguous and
+                         not obj.flags.c_contiguous)
+        metadata = dict(
+            kind='ndarray',
+            descr=dtype_to_descr(obj.dtype),
+            shape=list(obj.shape),
+            fortran_order=fortran_order,
+        )
+        if fortran_order:
+            data = obj.T
+        else:
+            data = numpy.ascontiguousarray(obj)
+        return metadata, memoryview(data.reshape(-1).view(numpy.uint8))
+    try:
+        view = memoryview(obj)
+    except TypeError:
+        raise ValueError("%s objects do not support the buffer protocol" %
+                         type(obj).__name__)
+    metadata = dict(
+        kind='buffer',
+        format=view.format,
+        shape=list(view.shape),
+    )
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    return metadata, view.cast('B')
+
+
+class SharedVariables(object):
+    """ Manage the variables this kernel publishes to and attaches from shared
+    memory.
+    """
+
+    def __init__(self, shell):
+        self.shell = weakref.ref(shell)
+
+        # Map names to the SharedMemory blocks that this kernel created.
+        self.published = {}
+
+        # Map names to the SharedMemory blocks that this kernel attached to.
+        self.attached = {}
+
+        # The blocks that could not be closed yet because arrays or
+        # memoryviews still use their mappings.
+        self.pending_close = []
+
+    @classmethod
+    def singleton(cls, shell):
+        """ Return the global singleton.
+        """
+        if not hasattr(shell, '_shared_variables_singleton'):
+            shell._shared_variables_singleton = cls(shell)
+            atexit.register(shell._shared_variables_singleton.shutdown_hook)
+        return shell._shared_variables_singleton
+
+    def shutdown_hook(self):
+        """ The shutdown hook.
+        """
+        for name in list(self.attached):
+            self.detach(name)
+        for name in list(self.published):
+            self.unpublish(name)
+        self._close_pending()
+
+    def publish(self, obj, name):
+        """ Copy an object into a new shared memory block.
+        """
+        check_name(name)
+        if name in self.published:
+            raise ValueError("%r is already shared" % name)
+        metadata, data = describe(obj)
+        metadata['nbytes'] = data.nbytes
+        encoded = json.dumps(metadata).encode('utf-8')
+        offset = _data_offset(len(encoded))
+        try:
+            shm = _shared_memory_class()(name=PREFIX + name, create=True,
+                                         size=offset + data.nbytes)
+        except FileExistsError:
+            raise ValueError("another kernel is already sharing %r" % name)
+        try:
+            HEADER.pack_into(shm.buf, 0, MAGIC, len(encoded))
+            shm.buf[HEADER.size:HEADER.size + len(encoded)] = encoded
+            shm.buf[offset:offset + data.nbytes] = data
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        self.published[name] = shm
+
+    def unpublish(self, name):
+        """ Stop sharing a variable and free its shared memory block.
+
+        Kernels which have already attached to it keep their mappings.
+        """
+        shm = self.published.pop(name)
+        self._close(shm)
+        shm.unlink()
+
+    def attach(self, name):
+        """ Map a shared variable published by another kernel without copying
+        it.
+        """
+        if name in self.published:
+            shm = self.published[name]
+            metadata, offset = read_metadata(shm, name)
+        elif name in self.attached:
+            shm = self.attached[name]
+            metadata, offset = read_metadata(shm, name)
+        else:
+            check_name(name)
+            try:
+                shm = _open_untracked(PREFIX + name)
+            except FileNotFoundError:
+                raise ValueError("no kernel is sharing %r" % name)
+            # Only track the block once we know it is one of ours.
+            try:
+                metadata, offset = read_metadata(shm, name)
+            except BaseException:
+                shm.close()
+                raise
+            self.attached[name] = shm
+        data = shm.buf[offset:offset + metadata['nbytes']]
+        if metadata['kind'] == 'ndarray':
+            import numpy
+            from numpy.lib.format import descr_to_dtype
+            dtype = descr_to_dtype(metadata['descr'])
+            shape = tuple(metadata['shape'])
+            if metadata['fortran_order']:
+                return numpy.frombuffer(data, dtype=dtype).reshape(
+                    shape[::-1]).T
+            return numpy.frombuffer(data, dtype=dtype).reshape(shape)
+        return data.cast(metadata['format'], metadata['shape'])
+
+    def detach(self, name):
+        """ Forget about a variable attached from another kernel.
+
+        The memory stays mapped for as long as anything references it.
+        """
+        shm = self.attached.pop(name)
+        self._close(shm)
+
+    def _close(self, shm):
+        """ Close a block's mapping, or put it off until there are no views of
+        it left.
+        """
+        self._close_pending()
+        try:
+            shm.close()
+        except BufferError:
+            # There are still arrays or memoryviews using the mapping.
+            self.pending_close.append(shm)
+
+    def _close_pending(self):
+        """ Close the blocks whose views have all gone away since they were
+        detached or unpublished.
+        """
+        pending = []
+        for shm in self.pending_close:
+            try:
+                shm.close()
+            except BufferError:
+                pending.append(shm)
+        self.pending_close = pending
+
+    def print_status(self):
+        """ Print the names of the published and attached variables.
+        """
+        for title, blocks in [('Shared', self.published),
+                              ('Attached', self.attached)]:
+            if blocks:
+                print('%s:' % title)
+                for name in sorted(blocks):
+                    print('  %s (%d bytes)' % (name, blocks[name].size))
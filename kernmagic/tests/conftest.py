@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture
+def ip():
+    """ An IPython shell with the kernmagic extension loaded.
+    """
+    from IPython.testing.globalipapp import get_ipython
+    shell = get_ipython()
+    shell.extension_manager.load_extension('kernmagic')
+    return shell
@@ -0,0 +1,161 @@
+from io import StringIO
+
+from kernmagic import mymagics
+
+
+DOCSTRING = u"""Add numbers.
+
+>>> x = 1
+>>> x + 1
+2
+"""
+
+
+def test_parse_docstring_is_cached():
+    parsed = mymagics.parse_docstring(DOCSTRING)
+    assert mymagics.parse_docstring(DOCSTRING) is parsed
+    assert parsed.src_blocks == ['x = 1\n', 'x + 1\n']
+    assert parsed.wants == {1: '2\n'}
+    code = parsed.compile(parsed.src_blocks[0])
+    assert parsed.compile(parsed.src_blocks[0]) is code
+
+
+def test_reload_reuses_parse_and_colors_lazily(ip):
+    demo = mymagics.DoctestDemo(StringIO(DOCSTRING), seed_ns={})
+    parsed = demo.parsed
+    assert demo._src_blocks_colored == [None, None]
+    demo.src = StringIO(DOCSTRING)
+    demo.reload()
+    assert demo.parsed is parsed
+    # Edits to one demo do not leak into the cache.
+    demo.src_blocks[0] = 'x = 2\n'
+    assert parsed.src_blocks[0] == 'x = 1\n'
+
+
+def test_parse_docstring_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(mymagics, 'PARSED_DOCSTRINGS_SIZE', 2)
+    first = mymagics.parse_docstring(u'>>> 1\n1\n')
+    mymagics.parse_docstring(u'>>> 2\n2\n')
+    # Using the first one again makes the second the least recently used.
+    assert mymagics.parse_docstring(u'>>> 1\n1\n') is first
+    mymagics.parse_docstring(u'>>> 3\n3\n')
+    assert len(mymagics._parsed_docstrings) == 2
+    assert mymagics.parse_docstring(u'>>> 1\n1\n') is first
+
+
+def test_show_colors_only_the_shown_block(ip, capsys):
+    demo = mymagics.DoctestDemo(StringIO(DOCSTRING), seed_ns={})
+    demo.show(1)
+    out = capsys.readouterr().out
+    assert '>>> ' in out
+    assert '2\n' in out
+    assert demo._src_blocks_colored[0] is None
+    assert demo._src_blocks_colored[1] is not None
+
+
+def test_run_examples_interactive(ip, capsys, monkeypatch):
+    from IPython.lib import demo
+    monkeypatch.setattr(demo.py3compat, 'input', lambda: '')
+
+    def documented():
+        pass
+    documented.__doc__ = DOCSTRING
+    ip.user_ns['documented'] = documented
+    ip.run_line_magic('run_examples', 'documented')
+    out = capsys.readouterr().out
+    assert '>>> x + 1\n2\n' in out
+    assert 'END OF DEMO' in out
+
+
+BATCH_DOCSTRING = u"""Batch examples.
+
+>>> y = [1] * 10
+>>> len(y)
+10
+>>> len(y) + 1
+5
+>>> def f(:
+...     pass
+>>> 1 // 0
+Traceback (most recent call last):
+ZeroDivisionError: integer division or modulo by zero
+>>> len(y)
+10
+"""
+
+
+def run_batch(ip):
+    demo = mymagics.DoctestDemo(StringIO(BATCH_DOCSTRING), seed_ns={},
+                                title='batch')
+    return demo.run_batch()
+
+
+def test_run_batch_checks_output(ip):
+    results = run_batch(ip)
+    assert [r.matched for r in results] == [True, True, False, False, True,
+                                            True]
+    assert results[2].got == '11\n'
+    assert results[0].peak > 0
+
+
+def test_run_batch_records_syntax_errors(ip):
+    results = run_batch(ip)
+    assert 'SyntaxError' in results[3].got
+    # The examples after it still run.
+    assert len(results) == 6
+
+
+def test_run_batch_keeps_user_traces(ip):
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        kept = [object() for _ in range(100)]
+        before = tracemalloc.take_snapshot()
+        run_batch(ip)
+        assert tracemalloc.is_tracing()
+        after = tracemalloc.take_snapshot()
+        assert len(after.traces) >= len(before.traces)
+        del kept
+    finally:
+        tracemalloc.stop()
+
+
+def test_run_examples_batch_magic(ip, capsys):
+    def documented():
+        pass
+    documented.__doc__ = BATCH_DOCSTRING
+    ip.user_ns['documented'] = documented
+    ip.run_line_magic('run_examples', '--batch documented')
+    out = capsys.readouterr().out
+    assert 'Ran 6 examples' in out
+    assert '4 passed, 2 failed' in out
+    assert 'Example documented:2 failed:' in out
+
+
+def test_run_batch_without_examples(ip, capsys):
+    demo = mymagics.DoctestDemo(StringIO(u'No examples here.'), seed_ns={})
+    assert demo.run_batch() == []
+    ip.run_line_magic('run_examples', '--batch len')
+    out = capsys.readouterr().out
+    assert 'Ran 0 examples' in out
+
+
+def test_run_batch_without_memory(ip):
+    import tracemalloc
+    demo = mymagics.DoctestDemo(StringIO(BATCH_DOCSTRING), seed_ns={})
+    results = demo.run_batch(memory=False)
+    assert not tracemalloc.is_tracing()
+    assert [r.peak for r in results] == [None] * 6
+    assert results[0].elapsed > 0
+    assert results[3].elapsed == 0.0
+
+
+def test_run_examples_batch_no_memory_magic(ip, capsys):
+    def documented():
+        pass
+    documented.__doc__ = BATCH_DOCSTRING
+    ip.user_ns['documented'] = documented
+    ip.run_line_magic('run_examples', '--batch --no-memory documented')
+    out = capsys.readouterr().out
+    assert 'Ran 6 examples' in out
+    assert 'Peak mem' in out
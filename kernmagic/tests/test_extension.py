@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import kernmagic
+from kernmagic.mymagics import KernMagics
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def test_magic_names_match_kernmagics():
+    assert sorted(kernmagic.MAGIC_NAMES) == sorted(KernMagics.magics['line'])
+
+
+def test_loading_is_lazy():
+    script = '\n'.join([
+        'import sys',
+        'from IPython.core.interactiveshell import InteractiveShell',
+        'ip = InteractiveShell.instance()',
+        'import kernmagic',
+        'kernmagic.load_ipython_extension(ip)',
+        'assert "kernmagic.mymagics" not in sys.modules',
+        'ip.run_line_magic("reload", "json")',
+        'assert "kernmagic.mymagics" in sys.modules',
+        'magic = ip.find_line_magic("print_methods")',
+        'print(type(magic.__self__).__name__)',
+    ])
+    out = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT,
+                                  universal_newlines=True)
+    assert out.strip() == 'KernMagics'
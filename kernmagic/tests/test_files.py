@@ -0,0 +1,29 @@
+import io
+
+
+def test_fwrite_fread_binary(ip, tmpdir):
+    filename = str(tmpdir.join('text'))
+    ip.user_ns['text'] = u'caf\xe9'
+    ip.run_line_magic('fwrite', 'text %s' % filename)
+    with open(filename, 'rb') as f:
+        assert f.read() == u'caf\xe9'.encode('utf-8')
+    ip.run_line_magic('fread', '-e utf-8 result %s' % filename)
+    assert ip.user_ns['result'] == u'caf\xe9'
+
+
+def test_fwrite_fread_text(ip, tmpdir):
+    filename = str(tmpdir.join('text'))
+    ip.user_ns['data'] = b'abc'
+    ip.run_line_magic('fwrite', '-m w data %s' % filename)
+    with io.open(filename, encoding='utf-8') as f:
+        assert f.read() == u'abc'
+    ip.run_line_magic('fread', '-m r -e utf-8 result %s' % filename)
+    assert ip.user_ns['result'] == u'abc'
+
+
+def test_fwrite_non_string(ip, tmpdir):
+    filename = str(tmpdir.join('number'))
+    ip.user_ns['number'] = 42
+    ip.run_line_magic('fwrite', 'number %s' % filename)
+    with open(filename, 'rb') as f:
+        assert f.read() == b'42'
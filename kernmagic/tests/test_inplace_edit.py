@@ -0,0 +1,17 @@
+from kernmagic.inplace_edit import Inplace
+
+
+SCALE = 3
+
+
+def original_function(x):
+    return x
+
+
+def test_execute_source_uses_original_globals(ip):
+    inplace = Inplace(ip)
+    new = inplace.execute_source(
+        original_function, u'def original_function(x):\n    return x * SCALE\n')
+    assert new(2) == 6
+    assert new.__name__ == 'original_function'
+    assert original_function(2) == 2
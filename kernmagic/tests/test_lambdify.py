@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+sympy = pytest.importorskip('sympy')
+numpy = pytest.importorskip('numpy')
+
+from sympy.utilities.lambdify import implemented_function
+
+from kernmagic import mymagics
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(mymagics, 'LAMBDIFY_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(mymagics, '_lambdified', {})
+    return tmp_path
+
+
+def test_lambdify_caches_in_memory_and_on_disk(ip, cache_dir, capsys):
+    x, y = sympy.symbols('x y')
+    ip.user_ns.update(x=x, y=y, e=sympy.sin(x)**2 + sympy.sin(x)*y)
+    ip.run_line_magic('lambdify', '-c f e x y')
+    ip.run_line_magic('lambdify', '-c f e x y')
+    mymagics._lambdified.clear()
+    ip.run_line_magic('lambdify', '-c f e x y')
+    out = capsys.readouterr().out.splitlines()
+    assert out == ['Compiled f.', 'Loaded f from the memory cache.',
+                   'Loaded f from the disk cache.']
+    assert len(os.listdir(str(cache_dir))) == 1
+    result = ip.user_ns['f'](numpy.array([0.5, 1.0]), 2.0)
+    expected = numpy.sin([0.5, 1.0])**2 + numpy.sin([0.5, 1.0]) * 2.0
+    numpy.testing.assert_allclose(result, expected)
+
+
+def test_lambdify_skips_disk_for_extra_names(cache_dir):
+    x = sympy.Symbol('x')
+    h = implemented_function('h', lambda v: v + 1)
+    func, origin = mymagics.cached_lambdify(h(x), [x], 'numpy', False,
+                                            str(cache_dir))
+    assert origin == 'compiled'
+    assert os.listdir(str(cache_dir)) == []
+    mymagics._lambdified.clear()
+    func, origin = mymagics.cached_lambdify(h(x), [x], 'numpy', False,
+                                            str(cache_dir))
+    assert origin == 'compiled'
+    assert func(1.0) == 2.0
+
+
+def test_lambdify_recompiles_unresolvable_disk_entry(cache_dir):
+    x = sympy.Symbol('x')
+    expr = sympy.cos(x)
+    key = mymagics.lambdify_key(expr, [x], 'numpy', False)
+    filename = os.path.join(str(cache_dir), key + '.py')
+    with open(filename, 'w') as f:
+        f.write('def _lambdifygenerated(x):\n    return missing(x)\n')
+    func, origin = mymagics.cached_lambdify(expr, [x], 'numpy', False,
+                                            str(cache_dir))
+    assert origin == 'compiled'
+    assert func(0.0) == 1.0
+    with open(filename) as f:
+        assert 'missing' not in f.read()
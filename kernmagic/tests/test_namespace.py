@@ -0,0 +1,53 @@
+import pickle
+
+from kernmagic.namespace import VersionedNamespace
+
+
+def test_versions_and_batched_notifications():
+    ns = VersionedNamespace(a=1)
+    seen = []
+    ns.listeners.append(seen.append)
+    exec('a = 2\nb = a + 1\ndel a', ns, ns)
+    ns.update(c=3)
+    ns |= {'d': 4}
+    ns.pop('c')
+    ns.setdefault('e', 5)
+    assert dict(ns.versions) == {'a': 2, 'b': 1, 'c': 2, 'd': 1, 'e': 1}
+    assert ns.version('b') == 1
+    assert ns.version('missing') == 0
+    assert seen == []
+    ns.flush()
+    assert seen == [frozenset('abcde')]
+    ns.flush()
+    assert len(seen) == 1
+
+
+def test_pickle():
+    ns = pickle.loads(pickle.dumps(VersionedNamespace(a=1)))
+    assert type(ns) is VersionedNamespace
+    assert ns == {'a': 1}
+
+
+def test_replace_context_versioned(ip):
+    original_ns = ip.user_ns
+    original_module = ip.user_module
+    ip.run_line_magic('replace_context', '--versioned')
+    try:
+        ns = ip.user_ns
+        assert isinstance(ns, VersionedNamespace)
+        assert ip.user_global_ns is ns
+        seen = []
+        ns.listeners.append(seen.append)
+        result = ip.run_cell('vc = 1\ndef vh():\n    return vc\nvr = vh()')
+        result.raise_error()
+        assert ns['vr'] == 1
+        assert ns.version('vc') == 1
+        assert seen and 'vc' in seen[-1]
+    finally:
+        ip.run_line_magic('replace_context', '')
+    assert ip.user_ns is original_ns
+    assert ip.user_module is original_module
+    assert ip.user_ns is ip.user_global_ns
+    assert ip.user_ns['vr'] == 1
+    ip.run_cell('vr2 = vh()').raise_error()
+    assert ip.user_ns['vr2'] == 1
@@ -0,0 +1,54 @@
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from kernmagic.mymagics import ErrorCounter
+
+
+def divide_zeros():
+    a = numpy.zeros(3)
+    for i in range(5):
+        a / a
+
+
+def test_error_counter_counts_and_samples():
+    counter = ErrorCounter(sample=2)
+    for i in range(5):
+        counter('invalid value', 8)
+    counter('overflow', 2)
+    assert counter.total == 6
+    assert counter.by_type == {'invalid value': 5, 'overflow': 1}
+    # The 1st, 3rd and 5th errors were sampled.
+    assert sum(counter.by_line.values()) == 3
+
+
+def test_count_mode(ip, capsys):
+    old_modes = numpy.geterr()
+    ip.run_line_magic('push_err', '-q -a count -s 1')
+    try:
+        assert isinstance(numpy.geterrcall(), ErrorCounter)
+        assert numpy.geterr()['invalid'] == 'call'
+        divide_zeros()
+        ip.run_line_magic('err_report', '')
+        out = capsys.readouterr().out
+        assert '5 floating point errors:' in out
+        assert 'divide_zeros' in out
+    finally:
+        ip.run_line_magic('pop_err', '')
+    out = capsys.readouterr().out
+    assert '5 floating point errors:' in out
+    assert 'Call:      None' in out
+    assert numpy.geterr() == old_modes
+
+
+def test_pop_err_quiet_suppresses_summary(ip, capsys):
+    ip.run_line_magic('push_err', '-q -a count')
+    divide_zeros()
+    ip.run_line_magic('pop_err', '-q')
+    assert capsys.readouterr().out == ''
+
+
+def test_err_report_requires_count_mode(ip):
+    from IPython.core.error import UsageError
+    with pytest.raises(UsageError):
+        ip.run_line_magic('err_report', '')
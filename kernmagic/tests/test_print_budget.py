@@ -0,0 +1,51 @@
+import sys
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from kernmagic.mymagics import BudgetedArrayFormatter, array_stats_summary
+
+
+def plain_text(ip, obj):
+    return ip.display_formatter.formatters['text/plain'](obj)
+
+
+def test_stats_summary():
+    text = array_stats_summary(numpy.arange(4.0))
+    assert text == 'array(shape=(4,), dtype=float64, min=0.0, max=3.0, mean=1.5)'
+
+
+def test_estimate_grows_with_size():
+    formatter = BudgetedArrayFormatter(1.0)
+    small = formatter.estimate_ms(numpy.zeros(10))
+    large = formatter.estimate_ms(numpy.zeros(500))
+    assert small < large
+
+
+def test_budget_is_pushed_and_popped(ip, capsys):
+    large = numpy.ones((8,) * 6)
+    default = plain_text(ip, large)
+    ip.run_line_magic('push_print', '-t 100000000 --budget 1')
+    try:
+        assert 'Threshold:  100000000' in capsys.readouterr().out
+        assert plain_text(ip, numpy.arange(3)) == 'array([0, 1, 2])'
+        # The full repr is over the budget, so it is summarized.
+        assert '...' in plain_text(ip, numpy.arange(10000.0))
+        # Even the summarized repr is over the budget.
+        assert plain_text(ip, large).startswith('array(shape=(8, 8, 8, 8')
+    finally:
+        ip.run_line_magic('pop_print', '-q')
+    assert plain_text(ip, large) == default
+
+
+def test_budget_without_threshold(ip, capsys):
+    ip.run_line_magic('push_print', '-q -t 0 --budget 1')
+    try:
+        assert numpy.get_printoptions()['threshold'] == sys.maxsize
+        assert plain_text(ip, numpy.arange(3)) == 'array([0, 1, 2])'
+        # Without thresholding the budget is all that keeps this short.
+        assert plain_text(ip, numpy.ones((8,) * 6)).startswith(
+            'array(shape=(8, 8, 8, 8')
+    finally:
+        ip.run_line_magic('pop_print', '-q')
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), 'benchmarks'))
+
+run_benchmarks = pytest.importorskip('run_benchmarks')
+
+
+def test_compare_flags_slowdowns_and_new_errors(capsys):
+    baseline = dict(
+        same=dict(min=1.0),
+        slower=dict(min=1.0),
+        broken=dict(min=1.0),
+        was_broken=dict(error='ValueError'),
+    )
+    results = dict(
+        same=dict(min=1.1),
+        slower=dict(min=2.0),
+        broken=dict(error='NameError'),
+        was_broken=dict(error='ValueError'),
+        new=dict(min=1.0),
+    )
+    regressions = run_benchmarks.compare(baseline, results, 1.2)
+    assert sorted(regressions) == ['broken', 'slower']
+    out = capsys.readouterr().out
+    assert 'ERROR' in out
+    assert 'SLOWER' in out
+
+
+def test_run_records_errors():
+    def time_fails():
+        raise ValueError('no good')
+    results = run_benchmarks.run([('fails', time_fails, {}),
+                                  ('works', lambda: (lambda: None), {})],
+                                 repeat=2, min_time=0.0)
+    assert 'no good' in results['fails']['error']
+    assert results['works']['repeat'] == 2
@@ -0,0 +1,78 @@
+import sys
+import textwrap
+
+import pytest
+
+from kernmagic import mymagics
+
+
+@pytest.fixture
+def example_package(tmp_path, monkeypatch):
+    """ A package with good, failing and broken examples.
+    """
+    package = tmp_path / 'kmexamples'
+    package.mkdir()
+    (package / '__init__.py').write_text(textwrap.dedent('''
+        """
+        >>> 1 + 1
+        2
+        """
+        X = 5
+
+
+        def f():
+            """
+            >>> X * 2
+            10
+            """
+    '''))
+    (package / 'broken.py').write_text(textwrap.dedent('''
+        def g():
+            """
+            >>> def h(:
+            ...     pass
+            >>> 3
+            4
+            """
+    '''))
+    (package / 'badindent.py').write_text(textwrap.dedent('''
+        def k():
+            """
+                >>> 1
+            1
+            """
+    '''))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield 'kmexamples'
+    for name in list(sys.modules):
+        if name.startswith('kmexamples'):
+            del sys.modules[name]
+
+
+def test_find_example_docstrings(example_package):
+    import importlib
+    tasks, failed = mymagics.find_example_docstrings(
+        importlib.import_module(example_package))
+    names = sorted(name for _, name, _ in tasks)
+    assert names == ['kmexamples', 'kmexamples.broken.g', 'kmexamples.f']
+    assert len(failed) == 1
+    assert failed[0].startswith(
+        'Could not find the examples in kmexamples.badindent')
+
+
+def test_run_docstring_examples_never_raises():
+    results = mymagics.run_docstring_examples(
+        ('kmexamples_missing', 'kmexamples_missing.f', '>>> 1\n1\n'))
+    assert len(results) == 1
+    assert not results[0].matched
+    assert 'ModuleNotFoundError' in results[0].got
+
+
+def test_run_examples_recursive(ip, example_package, capsys):
+    ip.run_line_magic('run_examples', '-r -j 2 %s' % example_package)
+    out = capsys.readouterr().out
+    assert 'Could not find the examples in kmexamples.badindent' in out
+    assert 'Ran 4 examples' in out
+    assert '2 passed, 2 failed' in out
+    assert 'Example kmexamples.broken.g:0 failed:' in out
+    assert 'Checked 3 docstrings' in out
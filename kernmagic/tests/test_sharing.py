@@ -0,0 +1,159 @@
+import os
+import subprocess
+import sys
+import textwrap
+import uuid
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+shared_memory = pytest.importorskip('multiprocessing.shared_memory')
+
+from IPython.core.error import UsageError
+
+from kernmagic import sharing
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+class FakeShell(object):
+    pass
+
+
+@pytest.fixture
+def shared():
+    shared = sharing.SharedVariables(FakeShell())
+    yield shared
+    shared.shutdown_hook()
+
+
+def unique_name():
+    return 'test_%s' % uuid.uuid4().hex[:12]
+
+
+def block_exists(name):
+    try:
+        shm = shared_memory.SharedMemory(name=sharing.PREFIX + name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    return True
+
+
+def test_attach_in_another_process_is_zero_copy(shared):
+    name = unique_name()
+    arr = numpy.arange(12.0).reshape(3, 4)
+    shared.publish(arr, name)
+    view = shared.attach(name)
+    script = textwrap.dedent('''
+        import sys
+        from kernmagic import sharing
+        class FakeShell(object):
+            pass
+        shared = sharing.SharedVariables(FakeShell())
+        view = shared.attach(sys.argv[1])
+        print(view.shape, view[1, 2])
+        view[0, 0] = 99.0
+        del view
+        shared.shutdown_hook()
+    ''')
+    out = subprocess.check_output(
+        [sys.executable, '-c', script, name], cwd=ROOT,
+        universal_newlines=True)
+    assert out.strip() == '(3, 4) 6.0'
+    # The other process wrote into the same memory.
+    assert view[0, 0] == 99.0
+    assert arr[0, 0] == 0.0
+    del view
+    shared.unpublish(name)
+    assert not block_exists(name)
+
+
+def test_fortran_arrays_and_buffers(shared):
+    fortran = numpy.asfortranarray(numpy.arange(6).reshape(2, 3))
+    fname, bname = unique_name(), unique_name()
+    shared.publish(fortran, fname)
+    shared.publish(bytearray(b'hello'), bname)
+    view = shared.attach(fname)
+    assert view.flags.f_contiguous
+    numpy.testing.assert_array_equal(view, fortran)
+    assert bytes(shared.attach(bname)) == b'hello'
+
+
+def test_publish_cleans_up_on_failure(shared, monkeypatch):
+    name = unique_name()
+    monkeypatch.setattr(sharing, 'MAGIC', u'not bytes')
+    with pytest.raises(Exception):
+        shared.publish(numpy.zeros(3), name)
+    assert name not in shared.published
+    assert not block_exists(name)
+
+
+def test_attach_rejects_foreign_blocks(shared):
+    name = unique_name()
+    shm = shared_memory.SharedMemory(name=sharing.PREFIX + name, create=True,
+                                     size=64)
+    try:
+        with pytest.raises(ValueError):
+            shared.attach(name)
+        assert name not in shared.attached
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_share_magics(ip, capsys):
+    name = unique_name()
+    ip.user_ns['shared_arr'] = numpy.arange(5)
+    ip.run_line_magic('share', 'shared_arr %s' % name)
+    ip.run_line_magic('attach', '%s attached_arr' % name)
+    numpy.testing.assert_array_equal(ip.user_ns['attached_arr'],
+                                     numpy.arange(5))
+    ip.run_line_magic('share', '-l')
+    assert name in capsys.readouterr().out
+    with pytest.raises(UsageError):
+        ip.run_line_magic('share', 'shared_arr %s' % name)
+    del ip.user_ns['attached_arr']
+    ip.run_line_magic('share', '-u %s' % name)
+    assert not block_exists(name)
+    with pytest.raises(UsageError):
+        ip.run_line_magic('attach', name)
+
+
+def test_numpy_scalars_come_back_as_numpy_values(shared):
+    name = unique_name()
+    shared.publish(numpy.float32(1.5), name)
+    value = shared.attach(name)
+    assert isinstance(value, numpy.ndarray)
+    assert value.shape == ()
+    assert value.dtype == numpy.float32
+    assert value[()] == 1.5
+
+
+def test_invalid_names_are_rejected(ip, shared):
+    for name in ['bad/name', '', '1abc', 'x' * (sharing.MAX_NAME_LENGTH + 1)]:
+        with pytest.raises(ValueError):
+            shared.publish(numpy.zeros(3), name)
+        with pytest.raises(ValueError):
+            shared.attach(name)
+    ip.user_ns['shared_arr'] = numpy.arange(5)
+    with pytest.raises(UsageError):
+        ip.run_line_magic('share', 'shared_arr bad/name')
+    with pytest.raises(UsageError):
+        ip.run_line_magic('attach', 'bad/name')
+
+
+def test_close_is_retried_once_views_are_gone(shared):
+    name = unique_name()
+    shared.publish(numpy.arange(3), name)
+    view = shared.attach(name)
+    shared.unpublish(name)
+    assert not block_exists(name)
+    # The mapping stays usable until the view is gone.
+    assert len(shared.pending_close) == 1
+    numpy.testing.assert_array_equal(view, numpy.arange(3))
+    del view
+    shared.shutdown_hook()
+    assert shared.pending_close == []
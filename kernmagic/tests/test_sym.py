@@ -0,0 +1,46 @@
+import pytest
+
+sympy = pytest.importorskip('sympy')
+
+from IPython.core.error import UsageError
+
+from kernmagic.mymagics import expand_symbol_names
+
+
+def test_expand_symbol_names():
+    assert expand_symbol_names('x') == ('x', None, ['x'], 'x')
+    bind, shape, names, label = expand_symbol_names('x0:3')
+    assert (bind, shape, names, label) == ('x', (3,), ['x0', 'x1', 'x2'],
+                                           'x0..x2')
+    bind, shape, names, label = expand_symbol_names('A[2,2]')
+    assert shape == (2, 2)
+    assert names == ['A_0_0', 'A_0_1', 'A_1_0', 'A_1_1']
+
+
+@pytest.mark.parametrize('spec', ['x0:0', 'x3:1', 'A[0]', 'A[2,0]', '1x'])
+def test_expand_symbol_names_rejects(spec):
+    with pytest.raises(UsageError):
+        expand_symbol_names(spec)
+
+
+def test_sym_bulk(ip, capsys):
+    ip.run_line_magic('sym', '-r s0:100 t B[2,3]')
+    out = capsys.readouterr().out
+    assert 'Adding real variables:' in out
+    assert 's0..s99' in out
+    assert ip.user_ns['s99'].is_real
+    assert ip.user_ns['B_1_2'] == sympy.Symbol('B_1_2', real=True)
+
+
+def test_sym_groups(ip):
+    ip.run_line_magic('sym', '-q -m M[2,2] v0:3')
+    assert ip.user_ns['M'].shape == (2, 2)
+    assert ip.user_ns['v'].shape == (3, 1)
+    ip.run_line_magic('sym', '-q -a C[2,2,2]')
+    assert ip.user_ns['C'].shape == (2, 2, 2)
+    assert ip.user_ns['C'][1, 1, 1] == sympy.Symbol('C_1_1_1')
+
+
+def test_sym_rejects_function_matrix(ip):
+    with pytest.raises(UsageError):
+        ip.run_line_magic('sym', '-f -m g[2]')